@@ -6,65 +6,252 @@ Improved scheduler: MRV‑based per‑week backtracking with schedule‑level re
 
 import streamlit as st
 import pandas as pd
+import numpy as np
+import openpyxl
+import xlsxwriter
 import random
+import bisect
 import io
-import itertools
+import os
+import concurrent.futures
 from pathlib import Path
 
+from week_kernel import NUMBA_AVAILABLE, gen_week
+
 # ==============================================================================
 # Configuration
 # ==============================================================================
 GROUP_SIZE = 4
 MAX_SCHEDULE_ATTEMPTS = 10  # number of full-schedule retries before giving up
+MAX_WEEK_RETRIES = 5  # times a week is re-searched when a later week dead-ends
+MAX_NODES_PER_WEEK = 1_000_000  # placement budget for the JIT week solver (split across workers)
+SEARCH_WORKERS = os.cpu_count() or 1  # parallel JIT searches per week, first valid week wins
+PLAYER_EDITOR_KEY = "player_editor"  # session key of the roster data_editor
+PLAYER_EDITOR_BASE_KEY = "player_editor_base"  # frame fed to the editor; rebuilt only with its edits
+# Session set mirroring each sorted player list, for O(1) membership checks
+MEMBERSHIP_SET_KEYS = {'included_players': 'included_set', 'excluded_players': 'excluded_set'}
+
+# Output table / file layout (allocated once, shared by every rerun)
+FIXED_COLS = ('Week', 'Group')
+PLAYER_COL_PREFIX = 'Player '
+EXCEL_UPLOAD_TYPES = ("xlsx",)
+EXCEL_MIME_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MIME_TYPE = "text/csv"
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')  # leading chars spreadsheets evaluate
+XLSX_WRITER_OPTIONS = {'strings_to_formulas': False, 'strings_to_urls': False}
+# st.cache_data is one cache shared by every session, so this must cover all
+# schedules on screen at once (~140 KB per 100-player, 30-week schedule across
+# the three formatters); the oldest are evicted beyond it
+SCHEDULE_CACHE_ENTRIES = 64
+SCHEDULE_TABLE_ROWS = 20  # rows shown before the on-screen table scrolls
+SCHEDULE_TABLE_HEIGHT = 700  # px height of a scrolling schedule table (headers stay pinned)
 
 # ==============================================================================
 # Core Scheduling Logic
 # ==============================================================================
 
-def pairs_of(group):
-    """Return frozensets for all 2‑player combos in a group."""
-    return [frozenset(p) for p in itertools.combinations(group, 2)]
-
-
-def build_week_mrv(remaining, group_size, past_pairs, groups_acc):
-    """Recursive backtracking for one week using MRV heuristic."""
-    if not remaining:
+def bits_of(mask):
+    """Return the ids of the set bits in an int mask, ascending."""
+    ids = []
+    while mask:
+        low = mask & -mask
+        ids.append(low.bit_length() - 1)
+        mask ^= low
+    return ids
+
+
+def lazy_shuffle(items):
+    """Yield items in random order, swapping each into place only when reached.
+
+    A partial Fisher–Yates: when the search accepts an early candidate, the
+    rest of the list is never shuffled.
+    """
+    n = len(items)
+    rand = random.random  # C-level draw; much cheaper than randrange per swap
+    for i in range(n):
+        j = i + int(rand() * (n - i))
+        items[i], items[j] = items[j], items[i]
+        yield items[i]
+
+
+def group_bits(group):
+    """Return the player mask for a group of ids."""
+    mask = 0
+    for p in group:
+        mask |= 1 << p
+    return mask
+
+
+def complete_groups(members, cand, need, played):
+    """Yield group masks extending ``members`` by ``need`` players from ``cand``.
+
+    ``cand`` holds players compatible with every member so far and is
+    narrowed by each pick (forward checking), so a dead end is detected as
+    soon as too few compatible players remain, not after the group is full.
+    """
+    if need == 0:
+        yield members
+        return
+    if cand.bit_count() < need:
+        return
+    for p in lazy_shuffle(bits_of(cand)):
+        cand &= ~(1 << p)  # groups with p are covered below; skip it from now on
+        yield from complete_groups(members | (1 << p), cand & ~played[p], need - 1, played)
+
+
+def complete_foursomes(first, cand, played):
+    """``complete_groups`` unrolled for groups of 4: three nested picks, no generator chain."""
+    if cand.bit_count() < 3:
+        return
+    for b in lazy_shuffle(bits_of(cand)):
+        cand &= ~(1 << b)
+        cand_b = cand & ~played[b]
+        if cand_b.bit_count() < 2:
+            continue
+        for c in lazy_shuffle(bits_of(cand_b)):
+            cand_b &= ~(1 << c)
+            cand_c = cand_b & ~played[c]
+            if not cand_c:
+                continue
+            base = (1 << first) | (1 << b) | (1 << c)
+            for d in lazy_shuffle(bits_of(cand_c)):
+                yield base | (1 << d)
+
+
+def build_week_mrv(avail, group_size, played, groups_acc):
+    """Recursive backtracking for one week using MRV and forward checking.
+
+    ``avail`` is a mask of the ids still unseated this week and ``played[p]``
+    the mask of p's past partners, so ``avail & ~played[p]`` is everyone p
+    may still be grouped with. Groups within a week are disjoint, so
+    ``played`` never changes during the search; ``groups_acc`` is extended
+    in place with group masks and returned on success.
+    """
+    if not avail:
         return groups_acc
 
     # MRV: pick the player with fewest available partners
-    def partner_degree(p):
-        return sum(1 for q in remaining if q != p and frozenset((p, q)) not in past_pairs)
+    first = min(bits_of(avail), key=lambda p: (avail & ~played[p]).bit_count())
+    compat = avail & ~played[first] & ~(1 << first)
 
-    first = min(remaining, key=partner_degree)
+    if group_size == 4:
+        candidates = complete_foursomes(first, compat, played)
+    else:
+        candidates = complete_groups(1 << first, compat, group_size - 1, played)
 
-    # Generate all partner combinations for 'first'
-    candidates = list(itertools.combinations([q for q in remaining if q != first], group_size - 1))
-    random.shuffle(candidates)
+    for group_mask in candidates:
+        # Journal the group on the shared list and pop it on backtrack,
+        # rather than copying the accumulated week at every node
+        groups_acc.append(group_mask)
+        result = build_week_mrv(avail & ~group_mask, group_size, played, groups_acc)
+        if result is not None:
+            return result
+        groups_acc.pop()
 
-    for partners in candidates:
-        group = (first, *partners)
-        gpairs = pairs_of(group)
-        # Skip if any pair already used
-        if any(p in past_pairs for p in gpairs):
-            continue
+    return None
 
-        # Commit this group
-        past_pairs.update(gpairs)
-        next_rem = [p for p in remaining if p not in group]
 
-        result = build_week_mrv(next_rem, group_size, past_pairs, groups_acc + [tuple(sorted(group))])
-        if result is not None:
-            return result
+def cyclic_week(labels, group_size, shift):
+    """Return group masks for the round‑robin week with column c rotated by c*shift groups.
 
-        # Backtrack
-        for p in gpairs:
-            past_pairs.remove(p)
+    ``labels`` is read as a grid of groups (rows) by ``group_size`` seats
+    (columns); shift 0 is the plain row split. When the group count has no
+    prime factor below ``group_size`` the shifts form orthogonal Latin
+    squares and never repeat a pair, so they seed weeks without any search.
+    """
+    num_groups = len(labels) // group_size
+    return [
+        group_bits(labels[((r + c * shift) % num_groups) * group_size + c] for c in range(group_size))
+        for r in range(num_groups)
+    ]
 
-    return None
+
+def run_week_kernel(n, group_size, pair_mat, budget, seed, stop):
+    """Run one seeded JIT search; returns the week's group masks or None."""
+    groups, ok = gen_week(np.arange(n, dtype=np.int32), pair_mat, n // group_size,
+                           group_size, budget, seed, stop)
+    if not ok:
+        return None
+    return [group_bits(int(p) for p in row) for row in groups]
+
+
+def solve_week(n, group_size, played, pair_mat, executor=None):
+    """Build one week as a list of group masks, using the JIT kernel when available.
+
+    The kernel releases the GIL, so SEARCH_WORKERS differently seeded
+    searches race on ``executor`` (a thread pool) and the first valid week
+    wins; it raises a shared stop flag so the rest bail out at their next
+    placement. Without an executor the seeds run one after another, and
+    without Numba the pure-Python solver runs single-threaded (threads
+    would only contend for the GIL).
+    """
+    if not NUMBA_AVAILABLE:
+        return build_week_mrv((1 << n) - 1, group_size, played, [])
+
+    budget = max(1, MAX_NODES_PER_WEEK // SEARCH_WORKERS)
+    seeds = [random.randrange(2**31) for _ in range(SEARCH_WORKERS)]
+    stop = np.zeros(1, dtype=np.uint8)
+    if executor is None:
+        for seed in seeds:
+            weekly = run_week_kernel(n, group_size, pair_mat, budget, seed, stop)
+            if weekly is not None:
+                return weekly
+        return None
+
+    pending = {executor.submit(run_week_kernel, n, group_size, pair_mat, budget, seed, stop) for seed in seeds}
+    try:
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                weekly = future.result()
+                if weekly is not None:
+                    return weekly
+        return None
+    finally:
+        # Stop the losers and let them drain before pair_mat is updated
+        stop[0] = 1
+        concurrent.futures.wait(pending)
+
+
+def mark_week(played, pair_mat, weekly, value):
+    """Record (value=1) or forget (value=0) the pairs of a week's group masks.
+
+    Every pair occurs in at most one week, so forgetting a week simply
+    clears its bits again.
+    """
+    groups = []
+    for mask in weekly:
+        group = bits_of(mask)
+        for p in group:
+            if value:
+                played[p] |= mask & ~(1 << p)
+            else:
+                played[p] &= ~mask
+        groups.append(group)
+    if pair_mat is not None:
+        # One vectorised write for the whole week: every (a, b) within a
+        # group, then the diagonal back to 0 (a player never pairs with itself)
+        ids = np.array(groups, dtype=np.intp)
+        size = ids.shape[1]
+        pair_mat[np.repeat(ids, size, axis=1), np.tile(ids, (1, size))] = value
+        pair_mat[ids, ids] = 0
+
+
+def max_unique_weeks(num_players, group_size):
+    """Upper bound on the weeks ``num_players`` can play without repeating a pair.
+
+    Each week uses ``group_size - 1`` of a player's ``num_players - 1``
+    possible partners. From the second week on, a group needs members from
+    ``group_size`` different first-week groups, so with fewer groups than
+    that only one week fits.
+    """
+    if num_players // group_size < group_size:
+        return 1
+    return (num_players - 1) // (group_size - 1)
 
 
 def create_schedule(golfer_list, num_weeks, group_size):
-    """Attempt to build a full schedule by retrying per-week MRV solver."""
+    """Attempt to build a full schedule week by week, backtracking a week on dead ends."""
     if not golfer_list:
         return None, "Error: Golfer list is empty."
 
@@ -72,22 +259,52 @@ def create_schedule(golfer_list, num_weeks, group_size):
     if n % group_size != 0:
         return None, f"Error: Number of players ({n}) must be divisible by {group_size}."
 
-    # Max unique weeks = (n-1) / (group_size - 1)
-    max_weeks = (n - 1) // (group_size - 1)
+    max_weeks = max_unique_weeks(n, group_size)
     if num_weeks > max_weeks:
         return None, f"Impossible: max unique weeks is {max_weeks}."
 
+    # Work on int ids internally; names are only looked up for the result
+    names = sorted(golfer_list)
+
+    # One pool for every week search in this call, not one per week
+    if NUMBA_AVAILABLE and SEARCH_WORKERS > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=SEARCH_WORKERS) as executor:
+            return run_schedule_attempts(names, num_weeks, group_size, executor)
+    return run_schedule_attempts(names, num_weeks, group_size, None)
+
+
+def run_schedule_attempts(names, num_weeks, group_size, executor):
+    """Retry loop behind ``create_schedule`` for a validated, sorted roster."""
+    n = len(names)
     for attempt in range(1, MAX_SCHEDULE_ATTEMPTS + 1):
-        past_pairs = set()
-        schedule = []
-        success = True
-        for wk in range(1, num_weeks + 1):
-            weekly = build_week_mrv(sorted(golfer_list), group_size, past_pairs, [])
+        played = [0] * n  # played[p]: mask of p's past partners
+        pair_mat = np.zeros((n, n), dtype=np.uint8) if NUMBA_AVAILABLE else None
+        weeks = []
+        retries = [0] * num_weeks
+        # Randomly relabelled round-robin layouts to try before searching
+        labels = random.sample(range(n), n)
+        shifts = list(range(n // group_size))
+        while len(weeks) < num_weeks:
+            weekly = None
+            while shifts and weekly is None:
+                candidate = cyclic_week(labels, group_size, shifts.pop(0))
+                if not any(played[p] & mask for mask in candidate for p in bits_of(mask)):
+                    weekly = candidate
             if weekly is None:
-                success = False
+                weekly = solve_week(n, group_size, played, pair_mat, executor)
+            if weekly is not None:
+                mark_week(played, pair_mat, weekly, 1)
+                weeks.append(weekly)
+                continue
+            # Dead end: backtrack one week and search it again, instead of
+            # discarding the whole schedule (bounded per week position)
+            if not weeks or retries[len(weeks) - 1] >= MAX_WEEK_RETRIES:
                 break
-            schedule.append(weekly)
-        if success:
+            retries[len(weeks) - 1] += 1
+            mark_week(played, pair_mat, weeks.pop(), 0)
+        if len(weeks) == num_weeks:
+            # Only now turn group masks back into name tuples (ids ascend, so names stay sorted)
+            schedule = [[tuple(names[i] for i in bits_of(mask)) for mask in weekly] for weekly in weeks]
             return schedule, f"Successfully generated schedule in {attempt} attempt(s)!"
 
     return None, f"Error: Could not generate a valid schedule after {MAX_SCHEDULE_ATTEMPTS} attempts."
@@ -102,6 +319,10 @@ def initialize_state():
         st.session_state.included_players = []
     if 'excluded_players' not in st.session_state:
         st.session_state.excluded_players = []
+    # Lists keep display order; the parallel sets answer "is this player here?"
+    for list_key, set_key in MEMBERSHIP_SET_KEYS.items():
+        if set_key not in st.session_state:
+            st.session_state[set_key] = set(st.session_state[list_key])
     if 'generated_schedule' not in st.session_state:
         st.session_state.generated_schedule = None
     if 'last_schedule_message' not in st.session_state:
@@ -110,19 +331,49 @@ def initialize_state():
     # but managing its value can be done directly or via on_change/callbacks.
     # Let's rely on button click reading the widget's current value for simplicity here.
 
+@st.cache_resource(show_spinner=False)
+def warm_up_jit():
+    """Compiles (or loads from Numba's cache) the week kernel once per server process.
+
+    Uses the same argument types as ``run_week_kernel`` so the first real
+    generation doesn't pay the compile time. ``week_kernel`` is imported,
+    not re-executed on reruns, so its one dispatcher stays compiled.
+    """
+    if NUMBA_AVAILABLE:
+        n = GROUP_SIZE * 2
+        gen_week(np.arange(n, dtype=np.int32), np.zeros((n, n), dtype=np.uint8), 2, GROUP_SIZE, 1, 0,
+                  np.zeros(1, dtype=np.uint8))
+    return NUMBA_AVAILABLE
+
+@st.cache_data(show_spinner=False)
+def parse_golfers(xlsx_bytes):
+    """Returns the sorted unique golfer names from column A (cached by file content)."""
+    # Read-only streaming of a single column; no pandas frame for a 1-column list
+    workbook = openpyxl.load_workbook(io.BytesIO(xlsx_bytes), read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        # Skip empty cells before converting to string, then get unique
+        names = {str(value) for (value,) in sheet.iter_rows(min_col=1, max_col=1, values_only=True)
+                 if value is not None}
+    finally:
+        workbook.close()
+    return sorted(names)
+
 def load_players_from_upload(uploaded_file_obj):
     """Loads golfer names and sets them as the initial 'included' list."""
     if uploaded_file_obj is None:
         return False # Indicate failure
 
     try:
-        df = pd.read_excel(uploaded_file_obj, header=None, usecols=[0], engine='openpyxl')
-        # Use dropna() before converting to string to handle empty rows, then get unique
-        golfer_names = df[0].dropna().astype(str).unique().tolist()
+        # Re-loading the same file is served from the cache
+        golfer_names = parse_golfers(uploaded_file_obj.getvalue())
 
-        # Reset lists and store loaded names
-        st.session_state.included_players = sorted(golfer_names) # Store sorted
+        # Reset lists and store loaded names (already sorted)
+        st.session_state.included_players = golfer_names
         st.session_state.excluded_players = []
+        st.session_state.included_set = set(golfer_names)
+        st.session_state.excluded_set = set()
+        st.session_state.pop(PLAYER_EDITOR_KEY, None) # Roster rows changed; drop stale edits
         st.session_state.generated_schedule = None # Clear previous schedule
         st.session_state.last_schedule_message = ""
         st.success(f"Successfully loaded {len(golfer_names)} unique golfers from file.")
@@ -137,15 +388,20 @@ def load_players_from_upload(uploaded_file_obj):
 
 def move_player(player_name, source_list_key, dest_list_key):
     """Moves a player between the included and excluded lists in session state."""
-    # Check if the source list exists and the player is in it
-    if source_list_key in st.session_state and player_name in st.session_state[source_list_key]:
+    source_set_key = MEMBERSHIP_SET_KEYS[source_list_key]
+    dest_set_key = MEMBERSHIP_SET_KEYS[dest_list_key]
+    # Check if the source list exists and the player is in it (set lookup, not a list scan)
+    if source_list_key in st.session_state and player_name in st.session_state.get(source_set_key, ()):
         st.session_state[source_list_key].remove(player_name)
+        st.session_state[source_set_key].discard(player_name)
         # Ensure destination list exists and add player if not already present
         if dest_list_key not in st.session_state:
             st.session_state[dest_list_key] = [] # Initialize if missing
-        if player_name not in st.session_state[dest_list_key]:
-            st.session_state[dest_list_key].append(player_name)
-            st.session_state[dest_list_key].sort() # Keep lists sorted
+        if dest_set_key not in st.session_state:
+            st.session_state[dest_set_key] = set()
+        if player_name not in st.session_state[dest_set_key]:
+            bisect.insort(st.session_state[dest_list_key], player_name) # Keep lists sorted
+            st.session_state[dest_set_key].add(player_name)
         # Clear schedule results as the player list has changed
         st.session_state.generated_schedule = None
         st.session_state.last_schedule_message = ""
@@ -160,34 +416,46 @@ def move_player(player_name, source_list_key, dest_list_key):
 
 
 def add_new_player(name_to_add):
-    """Adds a player from the text input to the included list."""
+    """Adds a player from the text input to the included list; returns True if the roster changed."""
     name = name_to_add.strip()
     if name: # Check if name is not empty
         # Initialize lists if they don't exist (robustness)
         if 'included_players' not in st.session_state: st.session_state.included_players = []
         if 'excluded_players' not in st.session_state: st.session_state.excluded_players = []
+        if 'included_set' not in st.session_state: st.session_state.included_set = set(st.session_state.included_players)
+        if 'excluded_set' not in st.session_state: st.session_state.excluded_set = set(st.session_state.excluded_players)
 
-        # Check if name already exists in either list
-        if name in st.session_state.included_players or name in st.session_state.excluded_players:
+        # Check if name already exists in either list (O(1) via the parallel sets)
+        if name in st.session_state.included_set or name in st.session_state.excluded_set:
             st.warning(f"Player '{name}' already exists in the lists.")
         else:
-            st.session_state.included_players.append(name)
-            st.session_state.included_players.sort()
+            bisect.insort(st.session_state.included_players, name) # Keep list sorted
+            st.session_state.included_set.add(name)
+            st.session_state.pop(PLAYER_EDITOR_KEY, None) # Roster rows changed; drop stale edits
             st.success(f"Added '{name}' to Included Players.")
             # Clear schedule results as the player list has changed
             st.session_state.generated_schedule = None
             st.session_state.last_schedule_message = ""
             # No need to clear input widget state manually here if we read value on click
+            return True
     else:
         st.warning("Please enter a name to add.")
+    return False
+
+
+def schedule_cache_key(schedule):
+    """Returns the schedule as nested tuples for the cached formatters."""
+    return tuple(tuple(tuple(group) for group in week) for week in schedule)
 
 
-def format_schedule_to_dataframe(schedule, group_size):
-    """Converts the schedule list into a pandas DataFrame for display."""
+@st.cache_data(show_spinner=False, max_entries=SCHEDULE_CACHE_ENTRIES)
+def schedule_rows(schedule, group_size):
+    """Returns the header row followed by one row per group, [] if empty (cached; see schedule_cache_key)."""
     if not schedule:
-        return pd.DataFrame()
+        return []
 
-    output_data = []
+    # Collect valid groups first; the widest one sets the number of player columns
+    entries = []
     for week_idx, weekly_groups in enumerate(schedule):
         week_num = week_idx + 1
         if not isinstance(weekly_groups, (list, tuple)):
@@ -199,50 +467,61 @@ def format_schedule_to_dataframe(schedule, group_size):
              if not isinstance(group_names, (list, tuple)):
                  print(f"Warning: Group {group_num} in Week {week_num} is not iterable: {group_names}")
                  continue
+             entries.append((week_num, group_num, group_names))
 
-             row = {'Week': week_num, 'Group': group_num}
-             for i, player_name in enumerate(group_names):
-                 row[f'Player {i+1}'] = player_name
-             for i in range(len(group_names), group_size):
-                  row[f'Player {i+1}'] = "" # Placeholder
-             output_data.append(row)
+    if not entries:
+        return []
 
-    if not output_data:
-        return pd.DataFrame()
+    # Ensure at least group_size player columns, more if a group is oversized
+    num_player_cols = max(group_size, max(len(group_names) for _, _, group_names in entries))
+    header = [*FIXED_COLS, *(f'{PLAYER_COL_PREFIX}{i+1}' for i in range(num_player_cols))]
 
-    df_output = pd.DataFrame(output_data)
-    # Determine actual max players shown in data, but ensure at least GROUP_SIZE cols exist if possible
-    player_cols_found = [col for col in df_output.columns if col.startswith('Player ')]
-    max_player_num = 0
-    if player_cols_found:
-        max_player_num = max((int(col.split(' ')[1]) for col in player_cols_found), default=0)
+    # Short groups are padded with "" so every row has the same width
+    rows = [header]
+    for week_num, group_num, group_names in entries:
+        rows.append([week_num, group_num, *group_names, *[""] * (num_player_cols - len(group_names))])
+    return rows
 
-    num_player_cols_to_ensure = max(max_player_num, group_size)
-    player_cols = [f'Player {i+1}' for i in range(num_player_cols_to_ensure)]
-    column_order = ['Week', 'Group'] + player_cols
 
-    # Add missing columns if needed before reindexing
-    for col in column_order:
-        if col not in df_output.columns:
-            df_output[col] = ""
+def escape_csv_cell(value):
+    """Prefixes text a spreadsheet would evaluate as a formula with ' so it opens as text."""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
 
-    df_output = df_output.reindex(columns=column_order, fill_value="")
-    df_output.fillna("", inplace=True) # Ensure no NaNs remain
 
-    return df_output
+@st.cache_data(show_spinner=False, max_entries=SCHEDULE_CACHE_ENTRIES)
+def generate_csv_download_data(schedule, group_size):
+    """Generates the schedule as UTF-8 CSV bytes, the fast default download (cached; see schedule_cache_key)."""
+    table_rows = schedule_rows(schedule, group_size)
+    if not table_rows:
+        print("Warning: Cannot generate download data, formatted schedule is empty.")
+        return None
+    header, *rows = table_rows
+    # Names are data: "=..." must not run as a formula when the CSV is opened
+    # (the xlsx gets the same guarantee from strings_to_formulas=False)
+    fixed = len(FIXED_COLS)
+    rows = [row[:fixed] + [escape_csv_cell(name) for name in row[fixed:]] for row in rows]
+    return pd.DataFrame(rows, columns=header).to_csv(index=False).encode('utf-8')
 
 
+@st.cache_data(show_spinner=False, max_entries=SCHEDULE_CACHE_ENTRIES)
 def generate_excel_download_data(schedule, group_size):
-    """Generates the Excel file content as bytes for download."""
-    df_output = format_schedule_to_dataframe(schedule, group_size)
-    if df_output.empty:
-        print("Warning: Cannot generate download data, formatted DataFrame is empty.")
+    """Generates the Excel file content as bytes for download (cached; see schedule_cache_key)."""
+    table_rows = schedule_rows(schedule, group_size)
+    if not table_rows:
+        print("Warning: Cannot generate download data, formatted schedule is empty.")
         return None
 
     buffer = io.BytesIO()
     try:
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            df_output.to_excel(writer, index=False, sheet_name='Schedule')
+        # Rows go straight to xlsxwriter in order, so constant_memory can flush
+        # each one as it is written; no DataFrame in between.
+        # Names are data: never turn "=..." into formulas or "http..." into links.
+        with xlsxwriter.Workbook(buffer, {'constant_memory': True, **XLSX_WRITER_OPTIONS}) as workbook:
+            worksheet = workbook.add_worksheet('Schedule')
+            for row_idx, row in enumerate(table_rows):
+                worksheet.write_row(row_idx, 0, row)
         # Using context manager handles buffer correctly.
         return buffer.getvalue()
     except Exception as e:
@@ -264,82 +543,101 @@ st.write("""
 # --- Initialize State ---
 # Ensures session state keys exist on first run or rerun
 initialize_state()
+warm_up_jit() # No-op after the first run in this process
 
 # --- Section 1: Load and Manage Players ---
 st.header("1. Manage Players")
 
-# File Upload
-uploaded_file = st.file_uploader(
-    "Upload Initial Golfer List (.xlsx)",
-    type=["xlsx"],
-    key="file_uploader", # Give it a key
-    help="Upload an Excel file (.xlsx) with golfer names listed one per row in the first column (Column A). Replaces current 'Included' list."
-)
-
-# Process upload ONLY if a file is present in the uploader widget
-if uploaded_file is not None:
-     # Use a button to confirm loading to prevent reload issues
-    if st.button(f"Load Players from '{uploaded_file.name}'"):
-        load_success = load_players_from_upload(uploaded_file)
-        if load_success:
-             # Try to clear the uploader widget state after successful load.
-             # This is experimental, might not always work perfectly across Streamlit versions.
-             # Consider advising user that file stays listed but is processed.
-             # st.session_state.file_uploader = None # This might cause issues, test carefully
-             st.rerun() # Rerun to update lists display after loading
-
-
-# Add New Player Input
-st.subheader("Add New Player")
-col_add1, col_add2 = st.columns([3,1])
-with col_add1:
-    # Use a unique key for the text input widget
-    new_player_name_input = st.text_input(
-        "New Player Name:",
-        key="new_player_name_widget"
+@st.fragment
+def roster_inputs():
+    """Upload and add-player controls, run as a fragment.
+
+    Picking a file, typing a name or a rejected add only reruns this
+    block (so its warning stays on screen); when the roster actually
+    changes we rerun the whole app so the lists, validation and results
+    below catch up.
+    """
+    # File Upload
+    uploaded_file = st.file_uploader(
+        "Upload Initial Golfer List (.xlsx)",
+        type=list(EXCEL_UPLOAD_TYPES),
+        key="file_uploader", # Give it a key
+        help="Upload an Excel file (.xlsx) with golfer names listed one per row in the first column (Column A). Replaces current 'Included' list."
     )
-with col_add2:
-    st.write("") # Vertical alignment spacer
-    st.write("") # Vertical alignment spacer
-    # When button is clicked, call add_new_player with the CURRENT value of the text input
-    if st.button("Add Player", help="Adds the name to the 'Included Players' list."):
-        add_new_player(new_player_name_input)
-        # Clear the widget's state after adding
-        st.session_state.new_player_name_widget = ""
-        st.rerun() # Rerun to reflect changes
-
-
-# Display Included/Excluded Lists side-by-side
+
+    # Process upload ONLY if a file is present in the uploader widget
+    if uploaded_file is not None:
+         # Use a button to confirm loading to prevent reload issues
+        if st.button(f"Load Players from '{uploaded_file.name}'"):
+            load_success = load_players_from_upload(uploaded_file)
+            if load_success:
+                 # The uploader keeps listing the file, but it has been processed.
+                 st.rerun() # Full-app rerun to update lists display after loading
+
+    # Add New Player Input
+    st.subheader("Add New Player")
+    # A form clears the text input on submit; assigning to the widget's
+    # session key after it has been created raises in Streamlit
+    with st.form("add_player_form", clear_on_submit=True, border=False):
+        col_add1, col_add2 = st.columns([3,1])
+        with col_add1:
+            # Use a unique key for the text input widget
+            new_player_name_input = st.text_input(
+                "New Player Name:",
+                key="new_player_name_widget"
+            )
+        with col_add2:
+            st.write("") # Vertical alignment spacer
+            st.write("") # Vertical alignment spacer
+            add_clicked = st.form_submit_button("Add Player", help="Adds the name to the 'Included Players' list.")
+    if add_clicked and add_new_player(new_player_name_input):
+        st.rerun() # Full-app rerun to reflect changes
+
+
+roster_inputs()
+
+
+# Display Included/Excluded Lists as a single editable table
 st.subheader("Player Lists")
-col_inc, col_exc = st.columns(2)
-
-with col_inc:
-    included_list = st.session_state.get('included_players', [])
-    st.markdown(f"**Included Players ({len(included_list)})**")
-    st.caption("Click name to Exclude ->")
-    if not included_list:
-        st.write("_No players currently included._")
-    else:
-        # Create buttons dynamically
-        for player in included_list:
-            # Use player name in the key to make it unique
-            if st.button(player, key=f"exc_{player}", help=f"Exclude {player}"):
-                 move_player(player, 'included_players', 'excluded_players')
-                 st.rerun() # Force rerun immediately
-
-
-with col_exc:
-    excluded_list = st.session_state.get('excluded_players', [])
-    st.markdown(f"**Excluded Players ({len(excluded_list)})**")
-    st.caption("<- Click name to Include")
-    if not excluded_list:
-        st.write("_No players currently excluded._")
-    else:
-        # Create buttons dynamically
-        for player in excluded_list:
-            if st.button(player, key=f"inc_{player}", help=f"Include {player}"):
-                 move_player(player, 'excluded_players', 'included_players')
-                 st.rerun() # Force rerun
+st.caption("Untick a player to exclude them, tick to include them again.")
+
+included_list = st.session_state.get('included_players', [])
+excluded_list = st.session_state.get('excluded_players', [])
+included_set = st.session_state.get('included_set', set())
+all_players = sorted(included_list + excluded_list)
+
+if not all_players:
+    st.write("_No players loaded yet._")
+else:
+    # One widget for the whole roster instead of a button per player. Its data
+    # must not follow its own edits: older Streamlit derives the widget id from
+    # the data, so a frame rebuilt after each toggle would drop the next edit.
+    # Loading or adding players drops the editor state, which rebuilds the base.
+    if PLAYER_EDITOR_KEY not in st.session_state or PLAYER_EDITOR_BASE_KEY not in st.session_state:
+        st.session_state[PLAYER_EDITOR_BASE_KEY] = pd.DataFrame({
+            'Player': all_players,
+            'Included': [player in included_set for player in all_players],
+        })
+    edited_df = st.data_editor(
+        st.session_state[PLAYER_EDITOR_BASE_KEY],
+        key=PLAYER_EDITOR_KEY, # Stable key so edits are reconciled across reruns
+        hide_index=True,
+        disabled=['Player'],
+        column_config={
+            'Included': st.column_config.CheckboxColumn("Included", help="Include this player in the schedule"),
+        },
+    )
+    # Apply only the rows whose checkbox differs from the current lists
+    changed = edited_df['Included'] != edited_df['Player'].map(included_set.__contains__)
+    for player, now_included in zip(edited_df.loc[changed, 'Player'], edited_df.loc[changed, 'Included']):
+        if now_included:
+            move_player(player, 'excluded_players', 'included_players')
+        else:
+            move_player(player, 'included_players', 'excluded_players')
+
+included_count = len(st.session_state.get('included_players', []))
+excluded_count = len(st.session_state.get('excluded_players', []))
+st.markdown(f"**Included Players ({included_count})** · **Excluded Players ({excluded_count})**")
 
 
 # --- Section 2: Generate Schedule ---
@@ -363,6 +661,7 @@ st.session_state.num_weeks_value = num_weeks_input
 players_to_schedule = st.session_state.get('included_players', [])
 num_players = len(players_to_schedule)
 num_weeks = int(num_weeks_input) # Already validated as >= 1 by number_input
+max_weeks = max_unique_weeks(num_players, GROUP_SIZE)
 
 validation_ok = True
 validation_messages = []
@@ -373,6 +672,13 @@ if num_players == 0:
 elif num_players % GROUP_SIZE != 0:
     validation_messages.append(f"Number of included players ({num_players}) must be divisible by {GROUP_SIZE}.")
     validation_ok = False
+elif num_weeks > max_weeks:
+    # Provably infeasible: don't spend the search budget finding out
+    validation_messages.append(
+        f"{num_players} players can play at most {max_weeks} week(s) "
+        "without repeating a pairing. Reduce the number of weeks or include more players."
+    )
+    validation_ok = False
 # num_weeks validation handled by widget min_value
 
 if validation_messages:
@@ -393,10 +699,10 @@ if st.button("Generate Schedule", disabled=(not validation_ok)):
             GROUP_SIZE
         )
 
-    # Store results in session state for display after rerun
+    # Store results in session state; Section 3 below reads them in this same run,
+    # and nothing above the button depends on them, so no st.rerun() is needed
     st.session_state.generated_schedule = final_schedule
     st.session_state.last_schedule_message = result_message
-    st.rerun() # Rerun to display the schedule and message below
 
 
 # --- Section 3: Display and Download Schedule ---
@@ -421,24 +727,47 @@ if last_msg:
 current_schedule = st.session_state.get('generated_schedule')
 if current_schedule:
     st.subheader("Generated Schedule Display")
-    schedule_df = format_schedule_to_dataframe(current_schedule, GROUP_SIZE)
-    if not schedule_df.empty:
-        # Use st.dataframe for interactive table, height might need adjustment
-        st.dataframe(schedule_df, hide_index=True, height=(min(len(schedule_df), 20) + 1) * 35 + 3)
+    # Tuple form so the cached formatters hit on every rerun of an unchanged schedule
+    schedule_key = schedule_cache_key(current_schedule)
+    table_rows = schedule_rows(schedule_key, GROUP_SIZE)
+    if table_rows:
+        header, *rows = table_rows
+        # Display-only, so a static table: no interactive grid to build and sync each rerun
+        st.table(
+            dict(zip(header, zip(*rows))),
+            hide_index=True,
+            height="content" if len(rows) <= SCHEDULE_TABLE_ROWS else SCHEDULE_TABLE_HEIGHT,
+        )
 
         st.subheader("Download Schedule")
-        excel_data = generate_excel_download_data(current_schedule, GROUP_SIZE)
-        if excel_data:
-            # Use actual number of players and generated weeks in filename
-            actual_weeks_generated = len(current_schedule)
-            num_players_in_schedule = len(st.session_state.get('included_players', []))
-            st.download_button(
-                label="Download Schedule as Excel (.xlsx)",
-                data=excel_data,
-                file_name=f"golf_schedule_{num_players_in_schedule}p_{actual_weeks_generated}w.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                key="download_button" # Add key for potential state management
-            )
+        # Use actual number of players and generated weeks in filename
+        actual_weeks_generated = len(current_schedule)
+        num_players_in_schedule = len(st.session_state.get('included_players', []))
+        file_stem = f"golf_schedule_{num_players_in_schedule}p_{actual_weeks_generated}w"
+        # CSV is the default: far cheaper to serialise than a zipped xlsx workbook
+        csv_data = generate_csv_download_data(schedule_key, GROUP_SIZE)
+        excel_data = generate_excel_download_data(schedule_key, GROUP_SIZE)
+        if csv_data or excel_data:
+            col_csv, col_xlsx = st.columns(2)
+            with col_csv:
+                if csv_data:
+                    st.download_button(
+                        label="Download Schedule as CSV (.csv)",
+                        data=csv_data,
+                        file_name=f"{file_stem}.csv",
+                        mime=CSV_MIME_TYPE,
+                        type="primary",
+                        key="download_csv_button"
+                    )
+            with col_xlsx:
+                if excel_data:
+                    st.download_button(
+                        label="Download Schedule as Excel (.xlsx)",
+                        data=excel_data,
+                        file_name=f"{file_stem}.xlsx",
+                        mime=EXCEL_MIME_TYPE,
+                        key="download_button" # Add key for potential state management
+                    )
         else:
             st.error("Could not prepare schedule for download.")
     # Handle case where formatting might fail even if schedule list exists
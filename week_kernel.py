@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Optional Numba kernel for the per-week solver.
+
+Kept out of the Streamlit script so that importing it has no side
+effects: loading Numba's disk cache re-imports the module that compiled
+the kernel, which for the app script would run the whole page again.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # Numba is optional; fall back to the pure-Python solver
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """No-op stand-in so the kernel below still defines without Numba."""
+        def decorator(func):
+            return func
+        return decorator
+
+
+@njit(cache=True, nogil=True)
+def gen_week(golfers, pair_mat, num_groups, gsize, max_attempts, seed, stop):
+    """Numba kernel: iterative MRV backtracking for one week.
+
+    Same search as ``golf_scheduler.build_week_mrv`` over an int32 id array and a uint8
+    ``pair_mat[a, b]`` of pairs already played. Players are visited in a
+    seeded random order; each group's leader is the unseated player with
+    the fewest compatible partners and its partners are tried as ordered
+    combinations. ``max_attempts`` caps the number of placements tried and
+    a non-zero ``stop[0]`` (set by the caller once another search has won)
+    aborts early. Returns a ``(num_groups, gsize)`` int32 array and a
+    success flag.
+    """
+    np.random.seed(seed)
+    n = golfers.shape[0]
+    order = golfers.copy()
+    for i in range(n - 1, 0, -1):  # Fisher–Yates
+        j = np.random.randint(0, i + 1)
+        tmp = order[i]
+        order[i] = order[j]
+        order[j] = tmp
+
+    seated = np.zeros(n, dtype=np.uint8)     # by position in 'order'
+    seat = np.full(n, -1, dtype=np.int32)    # seat k -> position in 'order'
+    groups = np.empty((num_groups, gsize), dtype=np.int32)
+    budget = max_attempts
+    k = 0
+    while k < n:
+        s = k % gsize
+        if s == 0:
+            if seat[k] != -1:
+                # Leader choice is forced, so exhausting it means backtrack
+                seated[seat[k]] = 0
+                seat[k] = -1
+                if k == 0:
+                    return groups, False
+                k -= 1
+                continue
+            # MRV: pick the unseated player with fewest available partners
+            best = -1
+            best_deg = n + 1
+            for i in range(n):
+                if seated[i]:
+                    continue
+                deg = 0
+                for j in range(n):
+                    if j != i and not seated[j] and pair_mat[order[i], order[j]] == 0:
+                        deg += 1
+                if deg < best_deg:
+                    best = i
+                    best_deg = deg
+            seat[k] = best
+            seated[best] = 1
+            k += 1
+            continue
+
+        if seat[k] != -1:
+            # Returning from a failed branch: release and try the next one
+            seated[seat[k]] = 0
+            start = seat[k] + 1
+        elif s > 1:
+            start = seat[k - 1] + 1
+        else:
+            start = 0
+
+        found = -1
+        for i in range(start, n):
+            if seated[i]:
+                continue
+            p = order[i]
+            ok = True
+            for t in range(k - s, k):
+                if pair_mat[p, order[seat[t]]]:
+                    ok = False
+                    break
+            if ok:
+                found = i
+                break
+
+        if found == -1:
+            seat[k] = -1
+            k -= 1
+            continue
+
+        budget -= 1
+        if budget < 0 or stop[0]:
+            return groups, False
+        seat[k] = found
+        seated[found] = 1
+        k += 1
+
+    for k in range(n):
+        groups[k // gsize, k % gsize] = order[seat[k]]
+    return groups, True